@@ -1,5 +1,6 @@
 # app.py
 import os
+import time
 import tempfile
 from pathlib import Path
 
@@ -50,9 +51,22 @@ def _msal_app(cache: msal.SerializableTokenCache) -> msal.PublicClientApplicatio
         st.stop()
     return msal.PublicClientApplication(CLIENT_ID, authority=AUTHORITY, token_cache=cache)
 
-def _acquire_token_interactive() -> str:
+def _cache_mtime() -> float:
+    try:
+        return _token_cache_path().stat().st_mtime
+    except OSError:
+        return 0.0
+
+@st.cache_resource(show_spinner=False)
+def _msal_state(cache_mtime: float) -> tuple[msal.PublicClientApplication, msal.SerializableTokenCache]:
+    # Keyed on the cache file's mtime: reruns still pay one stat() instead of
+    # a full deserialize, and a fresh login (new mtime) replaces the cached
+    # state instead of pinning it for the process lifetime.
     cache = _load_cache()
-    app = _msal_app(cache)
+    return _msal_app(cache), cache
+
+def _acquire_token_interactive() -> str:
+    app, cache = _msal_state(_cache_mtime())
 
     flow = app.initiate_device_flow(scopes=SCOPES)
     if "user_code" not in flow:
@@ -69,9 +83,19 @@ def _acquire_token_interactive() -> str:
     _save_cache(cache)
     return result["access_token"]
 
+@st.cache_resource(show_spinner=False)
+def _token_state() -> dict:
+    return {"token": None, "exp": 0.0}
+
 def _acquire_token_silent() -> str | None:
-    cache = _load_cache()
-    app = _msal_app(cache)
+    # Reuse the bearer until ~5 min before expiry instead of probing the MSAL
+    # cache on every rerun.
+    state = _token_state()
+    now = time.time()
+    if state["token"] and state["exp"] - now > 300:
+        return state["token"]
+
+    app, cache = _msal_state(_cache_mtime())
 
     accounts = app.get_accounts()
     if not accounts:
@@ -80,7 +104,9 @@ def _acquire_token_silent() -> str | None:
     result = app.acquire_token_silent(SCOPES, account=accounts[0])
     if result and "access_token" in result:
         _save_cache(cache)
-        return result["access_token"]
+        state["token"] = result["access_token"]
+        state["exp"] = now + float(result.get("expires_in", 3600))
+        return state["token"]
 
     return None
 
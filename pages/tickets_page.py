@@ -1,14 +1,20 @@
 # pages/tickets_page.py
+import hashlib
 import os
+import re
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import msal
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import requests
 import streamlit as st
 from dotenv import load_dotenv
+from pyarrow.parquet import read_schema
+
+from utils.graph import drive_id, get_token_silent_only, graph_download_to, invalidate_drive_id
 
 load_dotenv()
 
@@ -21,21 +27,11 @@ st.title("Tickets")
 # ==========================================
 # ENV (SharePoint file path + refresh cadence)
 # ==========================================
-TENANT_ID = os.getenv("TENANT_ID")
-CLIENT_ID = os.getenv("CLIENT_ID")
-
-SP_HOSTNAME = os.getenv("SP_HOSTNAME")      # groupcastillo.sharepoint.com
-SP_SITE_PATH = os.getenv("SP_SITE_PATH")    # /sites/GroupCastilloTeamSite
-SP_DRIVE_NAME = os.getenv("SP_DRIVE_NAME", "Documents")
-
 TICKETS_SP_PATH = os.getenv(
     "SP_FILE_PATH",
     "General/12433087 CANADA INC-MASTER/21-Work Orders-Complaints-Request/WorkOrders-Complaints-Master-2025-v1.xlsm"
 )
 
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
-SCOPES = ["User.Read", "Files.Read.All"]
-
 TICKETS_REFRESH_SECONDS = 30 * 60  # 30 minutes
 
 # ==========================================
@@ -50,81 +46,86 @@ SHEETS = {
 PRIORITY_COLORS = {"High": "#d32f2f", "Medium": "#fbc02d", "Low": "#388e3c"}
 PRIORITY_COLORS_LIGHT = {"High": "#f28b82", "Medium": "#ffe082", "Low": "#a5d6a7"}
 
-# ==========================================
-# TOKEN CACHE (disk) - SILENT ONLY (no login UI here)
-# ==========================================
-def _token_cache_path() -> Path:
-    d = Path(tempfile.gettempdir()) / "cnet_reports"
-    d.mkdir(exist_ok=True)
-    return d / "msal_token_cache.bin"
-
-def _load_cache() -> msal.SerializableTokenCache:
-    cache = msal.SerializableTokenCache()
-    p = _token_cache_path()
-    if p.exists():
-        cache.deserialize(p.read_text(encoding="utf-8"))
-    return cache
-
-def _save_cache(cache: msal.SerializableTokenCache):
-    if cache.has_state_changed:
-        _token_cache_path().write_text(cache.serialize(), encoding="utf-8")
-
-def _msal_app(cache: msal.SerializableTokenCache) -> msal.PublicClientApplication:
-    if not TENANT_ID or not CLIENT_ID:
-        raise RuntimeError("Missing TENANT_ID / CLIENT_ID in environment.")
-    return msal.PublicClientApplication(CLIENT_ID, authority=AUTHORITY, token_cache=cache)
+# Columns the charts actually consume; everything else is only needed by the
+# full-width Tables view and is loaded lazily there.
+NEEDED_COLS = tuple(sorted({"Priority", "Assigned To", "Date of the Work"} | {m["status_col"] for m in SHEETS.values()}))
 
-def get_token_silent_only() -> str:
-    cache = _load_cache()
-    app = _msal_app(cache)
+@st.cache_data(show_spinner=False, ttl=TICKETS_REFRESH_SECONDS)
+def download_tickets_excel_cached(sp_relative_path: str) -> str:
+    out_dir = Path(tempfile.gettempdir()) / "cnet_reports"
+    out_dir.mkdir(exist_ok=True)
+    local = out_dir / Path(sp_relative_path).name
 
-    accounts = app.get_accounts()
-    if not accounts:
-        raise RuntimeError("Not authenticated. Please connect in the main app (app.py).")
+    # Disk tier: the in-process cache dies with the process, but a file
+    # younger than the refresh window is still fresh — skip Graph entirely.
+    if local.exists() and time.time() - local.stat().st_mtime < TICKETS_REFRESH_SECONDS:
+        return str(local)
 
-    result = app.acquire_token_silent(SCOPES, account=accounts[0])
-    if result and "access_token" in result:
-        _save_cache(cache)
-        return result["access_token"]
+    token = get_token_silent_only()
+    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id()}/root:/{sp_relative_path}:/content"
+    try:
+        graph_download_to(url, token, local)
+    except RuntimeError:
+        # The cached drive id may be stale; re-resolve once and retry.
+        invalidate_drive_id()
+        url = f"https://graph.microsoft.com/v1.0/drives/{drive_id()}/root:/{sp_relative_path}:/content"
+        graph_download_to(url, token, local)
+    return str(local)
 
-    raise RuntimeError("Session expired. Please reconnect in the main app (app.py).")
+@st.cache_data(show_spinner=False)
+def _file_digest(path: str, mtime: float) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-# ==========================================
-# GRAPH HELPERS
-# ==========================================
-def graph_get(url: str, token: str):
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
-    return r.json()
-
-def graph_download(url: str, token: str) -> bytes:
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=120)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
-    return r.content
-
-def resolve_drive_id(token: str) -> str:
-    if not SP_HOSTNAME or not SP_SITE_PATH:
-        raise RuntimeError("Missing SP_HOSTNAME / SP_SITE_PATH in environment.")
-
-    site = graph_get(f"https://graph.microsoft.com/v1.0/sites/{SP_HOSTNAME}:{SP_SITE_PATH}", token)
-    drives = graph_get(f"https://graph.microsoft.com/v1.0/sites/{site['id']}/drives", token)["value"]
-    drive = next((d for d in drives if d.get("name") == SP_DRIVE_NAME), drives[0])
-    return drive["id"]
+def _parquet_cache_path(digest: str, sheet_name: str) -> Path:
+    d = Path(tempfile.gettempdir()) / "cnet_reports"
+    d.mkdir(exist_ok=True)
+    safe_sheet = re.sub(r"[^\w.-]", "_", sheet_name)
+    return d / f"{digest}.{safe_sheet}.parquet"
 
 @st.cache_data(show_spinner=False, ttl=TICKETS_REFRESH_SECONDS)
-def download_tickets_excel_cached(sp_relative_path: str) -> str:
-    token = get_token_silent_only()
-    drive_id = resolve_drive_id(token)
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{sp_relative_path}:/content"
-    content = graph_download(url, token)
+def load_all_sheets(path: str, mtime: float, columns: tuple[str, ...] | None = None) -> dict[str, pd.DataFrame]:
+    # Sheets parsed from a given download are snapshotted as parquet keyed on
+    # the content hash, so a refresh that returns identical bytes (common at
+    # 30 min cadence) never re-parses the xlsm. When `columns` is given, only
+    # those columns are read back and kept in cache.
+    digest = _file_digest(path, mtime)
+    out: dict[str, pd.DataFrame] = {}
+    missing = [name for name in SHEETS if not _parquet_cache_path(digest, SHEETS[name]["sheet"]).exists()]
+
+    if missing:
+        # One ExcelFile handle parses the workbook once for all sheets;
+        # calamine is the Rust-based reader, several times faster than
+        # openpyxl (macros in the .xlsm are ignored either way). Snapshots
+        # stay full-width so the Tables view can read them later.
+        with pd.ExcelFile(path, engine="calamine") as xl:
+            for name in missing:
+                df = xl.parse(SHEETS[name]["sheet"])
+                out[name] = df
+                try:
+                    df.to_parquet(_parquet_cache_path(digest, SHEETS[name]["sheet"]), compression="zstd")
+                except (ValueError, TypeError, OSError):
+                    # Mixed-type or duplicate columns can't round-trip; skip.
+                    pass
 
-    out_dir = Path(tempfile.gettempdir()) / "cnet_reports"
-    out_dir.mkdir(exist_ok=True)
-    local = out_dir / Path(sp_relative_path).name
-    local.write_bytes(content)
-    return str(local)
+    for name in SHEETS:
+        pq = _parquet_cache_path(digest, SHEETS[name]["sheet"])
+        if name in out:
+            continue
+        if columns is not None and pq.exists():
+            # Parquet reads are columnar, so pruning here skips the unused
+            # columns at the IO layer, not just after loading.
+            schema_names = read_schema(pq).names
+            out[name] = pd.read_parquet(pq, columns=[c for c in schema_names if c in columns])
+        else:
+            out[name] = pd.read_parquet(pq)
+
+    if columns is not None:
+        out = {name: df[[c for c in df.columns if c in columns]] for name, df in out.items()}
+    return out
 
 # ==========================================
 # SMALL UI HELPERS
@@ -156,41 +157,35 @@ def _clean_text(s: pd.Series) -> pd.Series:
     s = s.astype(str).str.strip()
     return s.replace({"": None, "nan": None, "None": None})
 
-def normalize_priority(s: pd.Series) -> pd.Series:
-    raw = _clean_text(s)
-    out = []
-    for v in raw:
-        if v is None:
-            out.append(None)
-        else:
-            vl = v.lower()
-            if "high" in vl:
-                out.append("High")
-            elif "medium" in vl:
-                out.append("Medium")
-            elif "low" in vl:
-                out.append("Low")
-            else:
-                out.append(None)
-    return pd.Series(out, index=s.index)
-
-def normalize_status(s: pd.Series) -> pd.Series:
-    raw = _clean_text(s)
-    out = []
-    for v in raw:
-        if v is None:
-            out.append(None)
-        else:
-            vl = v.lower()
-            if "closed" in vl:
-                out.append("Closed")
-            elif "progress" in vl:
-                out.append("In Progress")
-            elif "open" in vl:
-                out.append("Open")
-            else:
-                out.append("Other")
-    return pd.Series(out, index=s.index)
+def _clean_lower(s: pd.Series) -> pd.Series:
+    # Cast, strip and lower exactly once; the classifiers below take this
+    # prepared series so no column is walked twice.
+    sl = s.astype(str).str.strip().str.lower()
+    return sl.replace({"": None, "nan": None, "none": None})
+
+def normalize_priority(sl: pd.Series) -> pd.Series:
+    # `sl` must already be cleaned and lowered (_clean_lower). np.select over
+    # contains masks, not a single regex alternation: compound values like
+    # "medium/high" must classify by high > medium > low precedence, whereas
+    # str.extract would return whichever keyword appears first in the string.
+    conds = [
+        sl.str.contains("high", regex=False, na=False),
+        sl.str.contains("medium", regex=False, na=False),
+        sl.str.contains("low", regex=False, na=False),
+    ]
+    return pd.Series(np.select(conds, ["High", "Medium", "Low"], default=None), index=sl.index)
+
+def normalize_status(sl: pd.Series) -> pd.Series:
+    # `sl` must already be cleaned and lowered (_clean_lower). Same precedence
+    # reasoning as normalize_priority: "open - closed" is Closed, not Open.
+    conds = [
+        sl.str.contains("closed", regex=False, na=False),
+        sl.str.contains("progress", regex=False, na=False),
+        sl.str.contains("open", regex=False, na=False),
+    ]
+    out = pd.Series(np.select(conds, ["Closed", "In Progress", "Open"], default="Other"), index=sl.index)
+    out[sl.isna()] = None
+    return out
 
 def normalize_assigned_to(s: pd.Series) -> pd.Series:
     return _clean_text(s)
@@ -198,90 +193,98 @@ def normalize_assigned_to(s: pd.Series) -> pd.Series:
 # ==========================================
 # FILTERS
 # ==========================================
-def _prep_common(df: pd.DataFrame, status_col: str) -> pd.DataFrame:
+@st.cache_data(show_spinner=False, ttl=TICKETS_REFRESH_SECONDS)
+def prep_sheet(path: str, mtime: float, name: str) -> pd.DataFrame:
+    # Normalize once per (file, sheet); the filters below are then plain
+    # boolean masks instead of re-normalizing on every tab render. Only the
+    # three consumed columns are built — no copy of the rest of the sheet.
+    status_col = SHEETS[name]["status_col"]
+    df = load_all_sheets(path, mtime, NEEDED_COLS)[name]
     if status_col not in df.columns:
-        return df.iloc[0:0]
-
-    d = df.copy()
-
-    if "Priority" in d.columns:
-        d["Priority"] = normalize_priority(d["Priority"])
-    else:
-        d["Priority"] = None
-
-    d[status_col] = normalize_status(d[status_col])
-
-    if "Assigned To" in d.columns:
-        d["Assigned To"] = normalize_assigned_to(d["Assigned To"])
-    else:
-        d["Assigned To"] = None
+        return pd.DataFrame(columns=["Priority", status_col, "Assigned To"])
 
+    d = pd.DataFrame({
+        "Priority": normalize_priority(_clean_lower(df["Priority"])) if "Priority" in df.columns else None,
+        status_col: normalize_status(_clean_lower(df[status_col])),
+        "Assigned To": normalize_assigned_to(df["Assigned To"]) if "Assigned To" in df.columns else None,
+    }, index=df.index)
     d = d.dropna(subset=["Priority", status_col])
-    return d
 
-def filter_not_closed(df: pd.DataFrame, status_col: str) -> pd.DataFrame:
-    d = _prep_common(df, status_col)
-    return d[d[status_col] != "Closed"]
-
-def filter_closed(df: pd.DataFrame, status_col: str) -> pd.DataFrame:
-    d = _prep_common(df, status_col)
-    return d[d[status_col] == "Closed"]
+    # Low-cardinality labels become categories (int codes instead of Python
+    # strings); free-text columns go to Arrow-backed strings. Priority is
+    # ordered so groupbys and charts sort High > Medium > Low for free.
+    d["Priority"] = pd.Categorical(d["Priority"], categories=["High", "Medium", "Low"], ordered=True)
+    d[status_col] = d[status_col].astype("category")
+    d["Assigned To"] = d["Assigned To"].astype("string[pyarrow]")
+    return d
 
-# ==========================================
-# TABLE STYLING (ROW COLOR BY PRIORITY)
-# ==========================================
-def style_by_priority(df: pd.DataFrame):
-    def row_style(row):
-        p = row.get("Priority")
-        if p == "High":
-            return [f"background-color: {PRIORITY_COLORS_LIGHT['High']}; color:black"] * len(row)
-        if p == "Medium":
-            return [f"background-color: {PRIORITY_COLORS_LIGHT['Medium']}; color:black"] * len(row)
-        if p == "Low":
-            return [f"background-color: {PRIORITY_COLORS_LIGHT['Low']}; color:black"] * len(row)
-        return [""] * len(row)
-
-    return df.style.apply(row_style, axis=1)
+@st.cache_data(show_spinner=False, ttl=TICKETS_REFRESH_SECONDS)
+def prep_sheet_full(path: str, mtime: float, name: str) -> pd.DataFrame:
+    # Tables view: join the remaining sheet columns back onto the narrow
+    # normalized frame by index, only when that view actually renders.
+    d = prep_sheet(path, mtime, name)
+    df = load_all_sheets(path, mtime)[name]
+    extras = [c for c in df.columns if c not in d.columns]
+    return d.join(df[extras])
+
+def filter_not_closed(prepared: pd.DataFrame, status_col: str) -> pd.DataFrame:
+    return prepared[prepared[status_col] != "Closed"]
+
+def filter_closed(prepared: pd.DataFrame, status_col: str) -> pd.DataFrame:
+    return prepared[prepared[status_col] == "Closed"]
+
+def assignees_frame(prepped: dict[str, pd.DataFrame], names: list[str], closed: bool) -> pd.DataFrame:
+    # The sheets are already normalized; combining them is one boolean-indexed
+    # concat into a single contiguous frame, no per-sheet passes. Every sheet
+    # gets its Priority categories from the same fixed list in prep_sheet, so
+    # the dtype carries through the concat without upcasting to object;
+    # Copy-on-Write makes the concat lazy about copying the input blocks.
+    pick = filter_closed if closed else filter_not_closed
+    parts = [
+        pick(prepped[n], SHEETS[n]["status_col"])[["Assigned To", "Priority"]]
+        for n in names
+        if "Assigned To" in prepped[n].columns
+    ]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
 
 # ==========================================
 # CHARTS
+# Figure construction is cached on the small aggregate frames (st.cache_data
+# hashes DataFrame args by content), so a rerun with unchanged data reuses
+# the built figure instead of rebuilding every trace.
 # ==========================================
-def open_stacked_chart(df: pd.DataFrame, status_col: str, title: str):
-    if df.empty:
-        thumb_card("0 tickets pendientes")
-        return
-
-    g = df.groupby(["Priority", status_col]).size().reset_index(name="Count")
-    g["ColorKey"] = g["Priority"] + "|" + g[status_col]
-    g["Label"] = g[status_col] + ": " + g["Count"].astype(str)
-
-    color_map = {}
-    for p in ["High", "Medium", "Low"]:
-        color_map[f"{p}|Open"] = PRIORITY_COLORS[p]
-        color_map[f"{p}|In Progress"] = PRIORITY_COLORS_LIGHT[p]
-        color_map[f"{p}|Other"] = PRIORITY_COLORS[p]
-
+@st.cache_data(show_spinner=False)
+def _open_fig(g: pd.DataFrame, status_col: str, title: str):
+    # Color carries priority and the fill pattern carries status, straight
+    # from the categorical columns — no ColorKey/Label string building.
     fig = px.bar(
         g,
         x="Count",
         y="Priority",
-        color="ColorKey",
+        color="Priority",
+        pattern_shape=status_col,
         orientation="h",
-        color_discrete_map=color_map,
-        text="Label",
+        color_discrete_map=PRIORITY_COLORS,
+        text="Count",
         title=title,
     )
-    fig.update_layout(barmode="stack", showlegend=False)
+    fig.update_layout(barmode="stack", legend_title_text="")
     fig.update_traces(textposition="inside")
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-def closed_pie_chart(df: pd.DataFrame, title: str):
+def open_stacked_chart(df: pd.DataFrame, status_col: str, title: str):
     if df.empty:
-        thumb_card("0 tickets cerrados")
+        thumb_card("0 tickets pendientes")
         return
 
-    g = df.groupby("Priority").size().reset_index(name="Count")
-    fig = px.pie(
+    # observed=True buckets over the int category codes and never emits the
+    # unseen Priority x status combinations, so no Count > 0 pass is needed.
+    g = df.groupby(["Priority", status_col], observed=True).size().reset_index(name="Count")
+    st.plotly_chart(_open_fig(g, status_col, title), use_container_width=True)
+
+@st.cache_data(show_spinner=False)
+def _closed_fig(g: pd.DataFrame, title: str):
+    return px.pie(
         g,
         names="Priority",
         values="Count",
@@ -290,56 +293,80 @@ def closed_pie_chart(df: pd.DataFrame, title: str):
         color_discrete_map=PRIORITY_COLORS,
         hole=0.35,
     )
-    st.plotly_chart(fig, use_container_width=True)
 
-def assigned_to_bars_stacked_by_priority(df_all: pd.DataFrame, title: str):
-    if df_all.empty:
-        thumb_card("0 tickets", 260)
+def closed_pie_chart(df: pd.DataFrame, title: str):
+    if df.empty:
+        thumb_card("0 tickets cerrados")
         return
 
-    g = df_all.groupby(["Assigned To", "Priority"]).size().reset_index(name="Count")
-    order = g.groupby("Assigned To")["Count"].sum().sort_values(ascending=False).index
-    n_assignees = len(order)
+    g = df["Priority"].value_counts().rename("Count").reset_index()
+    g = g[g["Count"] > 0]
+    st.plotly_chart(_closed_fig(g, title), use_container_width=True)
 
+@st.cache_data(show_spinner=False)
+def _assignees_fig(g: pd.DataFrame, order: list[str], title: str):
     fig = px.bar(
         g,
         x="Count",
         y="Assigned To",
         color="Priority",
         orientation="h",
-        category_orders={"Assigned To": list(order)},
+        category_orders={"Assigned To": order},
         color_discrete_map=PRIORITY_COLORS,
         title=title,
         text="Count",
     )
     fig.update_layout(
         barmode="stack",
-        height=max(320, n_assignees * 48),
+        height=max(320, len(order) * 48),
         margin=dict(l=140, r=40, t=60, b=40),
     )
     fig.update_traces(textposition="outside", textangle=0, cliponaxis=False)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-def monthly_trend_chart(data_by_sheet: dict[str, pd.DataFrame]):
-    rows = []
-    for name, df in data_by_sheet.items():
-        if "Date of the Work" not in df.columns:
-            continue
+def assigned_to_bars_stacked_by_priority(df_all: pd.DataFrame, title: str):
+    if df_all.empty:
+        thumb_card("0 tickets", 260)
+        return
+
+    g = df_all.groupby(["Assigned To", "Priority"], observed=True).size().reset_index(name="Count")
+    order = df_all["Assigned To"].value_counts().index
+    st.plotly_chart(_assignees_fig(g, list(order), title), use_container_width=True)
+
+@st.cache_data(show_spinner=False, ttl=TICKETS_REFRESH_SECONDS)
+def monthly_counts(path: str, mtime: float) -> pd.DataFrame:
+    # Concatenate the date columns of every sheet first so to_datetime (the
+    # expensive step) and the groupby each run exactly once; the cache keeps
+    # tab switches from re-parsing dates.
+    data = load_all_sheets(path, mtime, NEEDED_COLS)
+    parts = [
+        df[["Date of the Work"]].assign(Type=name)
+        for name, df in data.items()
+        if "Date of the Work" in df.columns
+    ]
+    if not parts:
+        return pd.DataFrame(columns=["Type", "Month", "Count"])
+
+    allg = pd.concat(parts, ignore_index=True)
+    allg["Month"] = pd.to_datetime(allg["Date of the Work"], errors="coerce").dt.to_period("M").dt.to_timestamp()
+    return (
+        allg.dropna(subset=["Month"])
+        .groupby(["Type", "Month"], observed=True)
+        .size()
+        .reset_index(name="Count")
+        .sort_values("Month")
+    )
 
-        d = df.copy()
-        d["Date of the Work"] = pd.to_datetime(d["Date of the Work"], errors="coerce")
-        d = d.dropna(subset=["Date of the Work"])
-        d["Month"] = d["Date of the Work"].dt.to_period("M").dt.to_timestamp()
-        g = d.groupby("Month").size().reset_index(name="Count")
-        g["Type"] = name
-        rows.append(g)
+@st.cache_data(show_spinner=False)
+def _trend_fig(allg: pd.DataFrame):
+    return px.line(allg, x="Month", y="Count", color="Type", markers=True, title="Monthly trend")
 
-    if not rows:
+def monthly_trend_chart(path: str, mtime: float):
+    allg = monthly_counts(path, mtime)
+    if allg.empty:
         return
 
-    allg = pd.concat(rows, ignore_index=True)
-    fig = px.line(allg, x="Month", y="Count", color="Type", markers=True, title="Monthly trend")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_trend_fig(allg), use_container_width=True)
 
 # ==========================================
 # LOAD DATA (auto-refresh every 30 minutes)
@@ -356,10 +383,16 @@ if not EXCEL_PATH.exists():
     st.error("Tickets cache file missing after download.")
     st.stop()
 
-data: dict[str, pd.DataFrame] = {}
+EXCEL_MTIME = EXCEL_PATH.stat().st_mtime
+
 try:
-    for name, meta in SHEETS.items():
-        data[name] = pd.read_excel(EXCEL_PATH, sheet_name=meta["sheet"])
+    # The bulk string/categorical kernels release the GIL, so preparing the
+    # three sheets on a small thread pool overlaps their work; cache hits
+    # return instantly either way.
+    with ThreadPoolExecutor(max_workers=len(SHEETS)) as ex:
+        prepped: dict[str, pd.DataFrame] = dict(
+            zip(SHEETS, ex.map(lambda n: prep_sheet(str(EXCEL_PATH), EXCEL_MTIME, n), SHEETS))
+        )
 except Exception as e:
     st.error(f"Could not read Excel sheets: {e}")
     st.stop()
@@ -375,81 +408,71 @@ except Exception as e:
 # 1) THREE CHARTS SECTION
 # -------------------------------------------------------------------
 st.header("By Type")
-tab_3_open, tab_3_closed, tab_3_tables = st.tabs(["Open", "Closed", "Tables (Open)"])
+# st.tabs renders every tab on every rerun; a radio only runs the branch the
+# user is actually looking at, so hidden views cost nothing.
+type_view = st.radio("View", ["Open", "Closed", "Tables (Open)"], horizontal=True, key="type_view", label_visibility="collapsed")
 
-with tab_3_open:
+if type_view == "Open":
     c1, c2, c3 = st.columns(3)
     for col, name in zip([c1, c2, c3], SHEETS):
         with col:
             st.subheader(name)
             status_col = SHEETS[name]["status_col"]
-            df_nc = filter_not_closed(data[name], status_col)
+            df_nc = filter_not_closed(prepped[name], status_col)
             open_stacked_chart(df_nc, status_col, "By priority")
 
-with tab_3_closed:
+elif type_view == "Closed":
     c1, c2, c3 = st.columns(3)
     for col, name in zip([c1, c2, c3], SHEETS):
         with col:
             st.subheader(name)
             status_col = SHEETS[name]["status_col"]
-            df_c = filter_closed(data[name], status_col)
+            df_c = filter_closed(prepped[name], status_col)
             closed_pie_chart(df_c, "By priority")
 
-with tab_3_tables:
+else:
     for name in SHEETS:
         st.subheader(f"{name} (Not Closed)")
         status_col = SHEETS[name]["status_col"]
-        df_nc = filter_not_closed(data[name], status_col)
+        # Only the Tables view needs the full-width frame.
+        df_nc = filter_not_closed(prep_sheet_full(str(EXCEL_PATH), EXCEL_MTIME, name), status_col)
 
         if df_nc.empty:
             st.info("No open tickets.")
         else:
-            st.dataframe(style_by_priority(df_nc), use_container_width=True, hide_index=True)
+            # Plain st.dataframe serializes via Arrow; a Styler would go
+            # through per-cell HTML instead. One colored band per priority
+            # keeps the visual grouping.
+            for p in ["High", "Medium", "Low"]:
+                part = df_nc[df_nc["Priority"] == p]
+                if part.empty:
+                    continue
+                st.markdown(
+                    f"<div style='background:{PRIORITY_COLORS_LIGHT[p]};color:black;"
+                    f"padding:4px 10px;border-radius:6px;font-weight:700;'>{p}</div>",
+                    unsafe_allow_html=True,
+                )
+                st.dataframe(part, use_container_width=True, hide_index=True)
 
 # -------------------------------------------------------------------
 # 2) ASSIGNEES BAR CHARTS SECTION
 # -------------------------------------------------------------------
 st.header("Assignees")
-tab_a_open, tab_a_closed = st.tabs(["Open", "Closed"])
-
-with tab_a_open:
-    sources_open = st.multiselect(
-        "Sources: include",
-        options=list(SHEETS.keys()),
-        default=list(SHEETS.keys()),
-        key="assignees_open_sources",
-    )
-
-    open_combined = []
-    for name in sources_open:
-        status_col = SHEETS[name]["status_col"]
-        df_nc = filter_not_closed(data[name], status_col)
-        if not df_nc.empty and "Assigned To" in df_nc.columns:
-            open_combined.append(df_nc[["Assigned To", "Priority"]])
-
-    df_open_all = pd.concat(open_combined, ignore_index=True) if open_combined else pd.DataFrame()
-    assigned_to_bars_stacked_by_priority(df_open_all, "Assignees")
-
-with tab_a_closed:
-    sources_closed = st.multiselect(
-        "Sources: include",
-        options=list(SHEETS.keys()),
-        default=list(SHEETS.keys()),
-        key="assignees_closed_sources",
-    )
-
-    closed_combined = []
-    for name in sources_closed:
-        status_col = SHEETS[name]["status_col"]
-        df_c = filter_closed(data[name], status_col)
-        if not df_c.empty and "Assigned To" in df_c.columns:
-            closed_combined.append(df_c[["Assigned To", "Priority"]])
+assignees_view = st.radio("View", ["Open", "Closed"], horizontal=True, key="assignees_view", label_visibility="collapsed")
+closed_view = assignees_view == "Closed"
+
+sources = st.multiselect(
+    "Sources: include",
+    options=list(SHEETS.keys()),
+    default=list(SHEETS.keys()),
+    key=f"assignees_{'closed' if closed_view else 'open'}_sources",
+)
 
-    df_closed_all = pd.concat(closed_combined, ignore_index=True) if closed_combined else pd.DataFrame()
-    assigned_to_bars_stacked_by_priority(df_closed_all, "Assignees")
+df_all = assignees_frame(prepped, sources, closed=closed_view)
+assigned_to_bars_stacked_by_priority(df_all, "Assignees")
 
 # -------------------------------------------------------------------
 # 3) TRENDS
 # -------------------------------------------------------------------
 st.header("Trends")
-monthly_trend_chart(data)
+monthly_trend_chart(str(EXCEL_PATH), EXCEL_MTIME)
@@ -0,0 +1,251 @@
+# utils/graph.py
+# Shared Microsoft Graph access for the report pages: silent auth, one
+# keep-alive HTTP session, streamed downloads and drive-id resolution.
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import msal
+import requests
+import streamlit as st
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+# -------------------------
+# ENV
+# -------------------------
+TENANT_ID = os.getenv("TENANT_ID")
+CLIENT_ID = os.getenv("CLIENT_ID")
+
+SP_HOSTNAME = os.getenv("SP_HOSTNAME")      # groupcastillo.sharepoint.com
+SP_SITE_PATH = os.getenv("SP_SITE_PATH")    # /sites/GroupCastilloTeamSite
+SP_DRIVE_NAME = os.getenv("SP_DRIVE_NAME", "Documents")
+
+AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+SCOPES = ["User.Read", "Files.Read.All"]
+
+# -------------------------
+# TOKEN CACHE (disk) - SILENT ONLY (login UI lives in app.py)
+# -------------------------
+def _token_cache_path() -> Path:
+    d = Path(tempfile.gettempdir()) / "cnet_reports"
+    d.mkdir(exist_ok=True)
+    return d / "msal_token_cache.bin"
+
+def _load_cache() -> msal.SerializableTokenCache:
+    cache = msal.SerializableTokenCache()
+    p = _token_cache_path()
+    if p.exists():
+        cache.deserialize(p.read_text(encoding="utf-8"))
+    return cache
+
+def _save_cache(cache: msal.SerializableTokenCache):
+    if cache.has_state_changed:
+        _token_cache_path().write_text(cache.serialize(), encoding="utf-8")
+
+def _msal_app(cache: msal.SerializableTokenCache) -> msal.PublicClientApplication:
+    if not TENANT_ID or not CLIENT_ID:
+        raise RuntimeError("Missing TENANT_ID / CLIENT_ID in environment.")
+    return msal.PublicClientApplication(CLIENT_ID, authority=AUTHORITY, token_cache=cache)
+
+def _cache_mtime() -> float:
+    try:
+        return _token_cache_path().stat().st_mtime
+    except OSError:
+        return 0.0
+
+@st.cache_resource(show_spinner=False)
+def _msal_state(cache_mtime: float) -> tuple[msal.PublicClientApplication, msal.SerializableTokenCache]:
+    # Keyed on the cache file's mtime: reruns still pay one stat() instead of
+    # a full deserialize, but a login saved by app.py (new mtime) is picked up
+    # immediately rather than pinning a stale cache for the process lifetime.
+    cache = _load_cache()
+    return _msal_app(cache), cache
+
+@st.cache_resource(show_spinner=False)
+def _token_state() -> dict:
+    return {"token": None, "exp": 0.0}
+
+def get_token_silent_only() -> str:
+    # Reuse the bearer until ~5 min before expiry; the MSAL cache probe then
+    # runs roughly once an hour instead of on every rerun.
+    state = _token_state()
+    now = time.time()
+    if state["token"] and state["exp"] - now > 300:
+        return state["token"]
+
+    app, cache = _msal_state(_cache_mtime())
+
+    accounts = app.get_accounts()
+    if not accounts:
+        raise RuntimeError("Not authenticated. Please connect in the main app (app.py).")
+
+    result = app.acquire_token_silent(SCOPES, account=accounts[0])
+    if result and "access_token" in result:
+        _save_cache(cache)
+        state["token"] = result["access_token"]
+        state["exp"] = now + float(result.get("expires_in", 3600))
+        return state["token"]
+
+    raise RuntimeError("Session expired. Please reconnect in the main app (app.py).")
+
+# -------------------------
+# GRAPH HELPERS
+# -------------------------
+@st.cache_resource(show_spinner=False)
+def _graph_session() -> requests.Session:
+    # One keep-alive session per process: Graph calls reuse the TLS connection
+    # and transient 429/5xx responses are retried with backoff.
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ))
+    return s
+
+def graph_get(url: str, token: str):
+    r = _graph_session().get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60)
+    if r.status_code >= 400:
+        raise RuntimeError(r.text)
+    return r.json()
+
+def graph_download_to(url: str, token: str, dest: Path, chunksize: int = 8 * 1024 * 1024, max_concurrency: int = 4):
+    # Probe with a 1-byte range to learn the total size; small files (or servers
+    # without range support) fall back to a single streamed GET. Either way the
+    # body goes straight to disk, never fully into memory. Everything is
+    # written to a .part sibling and renamed into place on success, so a
+    # failed transfer never clobbers the last good file.
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Conditional GET: if we still have the previous download and its ETag,
+    # an unchanged file costs one 304 instead of a full transfer.
+    etag_path = Path(f"{dest}.etag")
+    if dest.exists() and etag_path.exists():
+        headers["If-None-Match"] = etag_path.read_text(encoding="utf-8").strip()
+
+    probe = _graph_session().get(url, headers={**headers, "Range": "bytes=0-0"}, stream=True, timeout=60)
+    if probe.status_code == 304:
+        probe.close()
+        # Content unchanged; bump the mtime so disk-freshness checks restart
+        # their window from this successful revalidation.
+        os.utime(dest)
+        return
+    if probe.status_code >= 400:
+        text = probe.text
+        probe.close()
+        raise RuntimeError(text)
+
+    headers.pop("If-None-Match", None)
+    part = Path(f"{dest}.part")
+
+    content_range = probe.headers.get("Content-Range", "")
+    total = int(content_range.rsplit("/", 1)[-1]) if "/" in content_range else 0
+
+    if probe.status_code != 206:
+        # The server ignored the Range header, so the probe response already
+        # carries the full body — stream it to disk instead of fetching twice.
+        with probe, open(part, "wb") as f:
+            for chunk in probe.iter_content(1 << 20):
+                f.write(chunk)
+        etag = probe.headers.get("ETag")
+    elif total <= chunksize or max_concurrency <= 1:
+        probe.close()
+        with _graph_session().get(url, headers=headers, stream=True, timeout=120) as r:
+            if r.status_code >= 400:
+                raise RuntimeError(r.text)
+            with open(part, "wb") as f:
+                for chunk in r.iter_content(1 << 20):
+                    f.write(chunk)
+            etag = r.headers.get("ETag")
+    else:
+        probe.close()
+        with open(part, "wb") as f:
+            f.truncate(total)
+
+        def _fetch(span: tuple[int, int]):
+            a, b = span
+            with _graph_session().get(url, headers={**headers, "Range": f"bytes={a}-{b}"}, stream=True, timeout=120) as r:
+                if r.status_code >= 400:
+                    raise RuntimeError(r.text)
+                with open(part, "r+b") as f:
+                    f.seek(a)
+                    for chunk in r.iter_content(1 << 20):
+                        f.write(chunk)
+
+        spans = [(a, min(a + chunksize, total) - 1) for a in range(0, total, chunksize)]
+        with ThreadPoolExecutor(max_workers=max_concurrency) as ex:
+            list(ex.map(_fetch, spans))
+        etag = probe.headers.get("ETag")
+
+    # Publish atomically; the .etag sidecar follows only once dest is the new
+    # content, so it can never vouch for a partial file.
+    os.replace(part, dest)
+    if etag:
+        etag_path.write_text(etag, encoding="utf-8")
+    else:
+        etag_path.unlink(missing_ok=True)
+
+# -------------------------
+# DRIVE ID
+# -------------------------
+def resolve_drive_id(token: str) -> str:
+    if not SP_HOSTNAME or not SP_SITE_PATH:
+        raise RuntimeError("Missing SP_HOSTNAME / SP_SITE_PATH in environment.")
+
+    # Path addressing lets Graph resolve the site and list its drives in a
+    # single round trip; no separate site-id lookup needed.
+    drives = graph_get(
+        f"https://graph.microsoft.com/v1.0/sites/{SP_HOSTNAME}:{SP_SITE_PATH}:/drives",
+        token,
+    )["value"]
+    drive = next((d for d in drives if d.get("name") == SP_DRIVE_NAME), drives[0])
+    return drive["id"]
+
+def _drive_id_store_path() -> Path:
+    d = Path(tempfile.gettempdir()) / "cnet_reports"
+    d.mkdir(exist_ok=True)
+    return d / "drive_id.json"
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def resolve_drive_id_cached(hostname: str, site_path: str, drive_name: str) -> str:
+    # Drive ids are effectively static; persist them so neither a rerun nor a
+    # process restart pays the two Graph round trips again.
+    store = _drive_id_store_path()
+    key = f"{hostname}|{site_path}|{drive_name}"
+
+    known: dict[str, str] = {}
+    try:
+        known = json.loads(store.read_text(encoding="utf-8"))
+        if key in known:
+            return known[key]
+    except (OSError, ValueError):
+        known = {}
+
+    drive_id_value = resolve_drive_id(get_token_silent_only())
+    known[key] = drive_id_value
+    store.write_text(json.dumps(known), encoding="utf-8")
+    return drive_id_value
+
+def drive_id() -> str:
+    return resolve_drive_id_cached(SP_HOSTNAME, SP_SITE_PATH, SP_DRIVE_NAME)
+
+def invalidate_drive_id():
+    # If the persisted id goes stale (site or drive recreated), drop both
+    # cache layers so the next drive_id() call re-resolves against Graph.
+    try:
+        _drive_id_store_path().unlink()
+    except OSError:
+        pass
+    resolve_drive_id_cached.clear()
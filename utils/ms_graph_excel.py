@@ -6,6 +6,8 @@ from pathlib import Path
 import msal
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # -------------------------
 # ENV
@@ -75,17 +77,37 @@ def _get_token_silent_or_interactive() -> str:
 # -------------------------
 # GRAPH HELPERS
 # -------------------------
+@st.cache_resource(show_spinner=False)
+def _graph_session() -> requests.Session:
+    # One keep-alive session per process: Graph calls reuse the TLS connection
+    # and transient 429/5xx responses are retried with backoff.
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ))
+    return s
+
 def _graph_get(url: str, token: str):
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60)
+    r = _graph_session().get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60)
     if r.status_code >= 400:
         raise RuntimeError(r.text)
     return r.json()
 
-def _graph_download(url: str, token: str) -> bytes:
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=120)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
-    return r.content
+def _graph_download_to(url: str, token: str, dest: Path):
+    # Stream straight to disk; the workbook never sits fully in memory.
+    with _graph_session().get(url, headers={"Authorization": f"Bearer {token}"}, stream=True, timeout=120) as r:
+        if r.status_code >= 400:
+            raise RuntimeError(r.text)
+        with open(dest, "wb") as f:
+            for chunk in r.iter_content(1 << 20):
+                f.write(chunk)
 
 def _resolve_drive_id(token: str) -> str:
     if not SP_HOSTNAME or not SP_SITE_PATH:
@@ -109,11 +131,10 @@ def download_excel_cached(sp_relative_path: str, ttl_seconds: int) -> str:
     drive_id = _resolve_drive_id(token)
 
     url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{sp_relative_path}:/content"
-    content = _graph_download(url, token)
 
     out_dir = Path(tempfile.gettempdir()) / "cnet_reports"
     out_dir.mkdir(exist_ok=True)
 
     local = out_dir / Path(sp_relative_path).name
-    local.write_bytes(content)
+    _graph_download_to(url, token, local)
     return str(local)